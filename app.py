@@ -30,7 +30,7 @@ if st.sidebar.button("View Instructions", use_container_width=True):
 st.sidebar.markdown("---")
 st.sidebar.subheader("Workout History")
 if st.sidebar.checkbox("Show Progress"):
-    history = get_history()
+    history = list(get_history(limit=100))
     if history:
         for exercise, reps, time in history:
             st.sidebar.write(f"**{exercise}**: {reps} reps ({time[:16]})")
@@ -1,34 +1,95 @@
+import atexit
 import sqlite3
+import threading
+import time
 from datetime import datetime
 
+DB_PATH = 'workout_history.db'
+
+FLUSH_INTERVAL = 2.0   # giây giữa 2 lần flush
+FLUSH_BATCH_SIZE = 32  # flush ngay khi buffer đầy
+
+# Kết nối dùng chung cho cả app: mở một lần, giữ page cache nóng thay vì
+# connect/close cho mỗi lần ghi rep. check_same_thread=False vì frame callback
+# chạy trên thread riêng của webrtc.
+_conn = None
+_lock = threading.Lock()
+
+# Buffer ghi: save_session chỉ append vào đây, _flush gom nhiều rep vào một
+# transaction duy nhất để amortize chi phí commit. Đánh đổi: nếu app crash
+# thì mất tối đa FLUSH_INTERVAL giây dữ liệu chưa flush.
+_pending = []
+_last_flush = 0.0
+
+# Một chuỗi SQL duy nhất cho mọi lần flush: sqlite3 cache prepared statement
+# theo đúng text trên kết nối persistent, nên dùng lại hằng này là parse/plan
+# một lần cho cả phiên.
+_INSERT_SQL = 'INSERT INTO sessions (exercise_name, reps, timestamp) VALUES (?, ?, ?)'
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+        # WAL + synchronous=NORMAL: mỗi INSERT chỉ còn là một lần append vào
+        # WAL thay vì full fsync; busy_timeout tránh lỗi "database is locked"
+        # khi có burst ghi rep.
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("PRAGMA busy_timeout=5000")
+        _conn.execute("PRAGMA temp_store=MEMORY")
+        _conn.execute("PRAGMA cache_size=-8000")
+        atexit.register(_close)
+    return _conn
+
+def _close():
+    flush_now()
+    _conn.close()
+
 def init_db():
-    conn = sqlite3.connect('workout_history.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            exercise_name TEXT,
-            reps INTEGER,
-            timestamp DATETIME
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    global _last_flush
+    with _lock:
+        conn = _get_conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                exercise_name TEXT,
+                reps INTEGER,
+                timestamp DATETIME
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_ts ON sessions(timestamp DESC)')
+        _last_flush = time.time()
+
+def _flush():
+    # Gọi khi đang giữ _lock. Gom toàn bộ buffer vào một transaction.
+    global _last_flush
+    if _pending:
+        conn = _get_conn()
+        conn.execute("BEGIN")
+        conn.executemany(_INSERT_SQL, _pending)
+        conn.execute("COMMIT")
+        _pending.clear()
+    _last_flush = time.time()
 
 def save_session(exercise_name, reps):
-    conn = sqlite3.connect('workout_history.db')
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO sessions (exercise_name, reps, timestamp)
-        VALUES (?, ?, ?)
-    ''', (exercise_name, reps, datetime.now()))
-    conn.commit()
-    conn.close()
-
-def get_history():
-    conn = sqlite3.connect('workout_history.db')
-    c = conn.cursor()
-    c.execute('SELECT exercise_name, reps, timestamp FROM sessions ORDER BY timestamp DESC')
-    data = c.fetchall()
-    conn.close()
-    return data
\ No newline at end of file
+    with _lock:
+        _pending.append((exercise_name, reps, datetime.now()))
+        if len(_pending) >= FLUSH_BATCH_SIZE or (time.time() - _last_flush) >= FLUSH_INTERVAL:
+            _flush()
+
+def flush_now():
+    with _lock:
+        _flush()
+
+def get_history(limit=100, offset=0):
+    # Generator: trả từng dòng thay vì fetchall() toàn bộ lịch sử, kết hợp
+    # LIMIT/OFFSET + idx_sessions_ts nên chỉ tốn O(limit) cả về thời gian
+    # lẫn bộ nhớ; UI có thể render dần từ dòng đầu tiên.
+    with _lock:
+        _flush()  # để lịch sử luôn thấy các rep vừa ghi
+        c = _get_conn().execute('''
+            SELECT exercise_name, reps, timestamp FROM sessions
+            ORDER BY timestamp DESC LIMIT ? OFFSET ?
+        ''', (limit, offset))
+        c.arraysize = 64
+    yield from c
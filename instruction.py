@@ -1,4 +1,5 @@
 import streamlit as st
+from enum import IntEnum
 
 class BicepCurlInstruction:
     
@@ -59,6 +60,16 @@ class OverheadPressInstruction:
     ]
 
 
+class Exercise(IntEnum):
+    BICEP_CURL = 0
+    LATERAL_RAISE = 1
+    OVERHEAD_PRESS = 2
+
+
+# Bảng tuple theo Exercise: code nóng (gọi mỗi frame/rerun) tra theo chỉ số,
+# không cần hash chuỗi. Dict tên bài tập giữ lại cho caller cũ truyền string.
+_INSTR_TUPLE = (BicepCurlInstruction, LateralRaiseInstruction, OverheadPressInstruction)
+
 INSTRUCTION_CLASSES = {
     "Bicep Curl": BicepCurlInstruction,
     "Lateral Raise": LateralRaiseInstruction,
@@ -67,23 +78,37 @@ INSTRUCTION_CLASSES = {
 
 
 def get_instruction_class(exercise_name):
+    if isinstance(exercise_name, Exercise):
+        return _INSTR_TUPLE[exercise_name]
     return INSTRUCTION_CLASSES.get(exercise_name)
 
 
+# setup/execution là dữ liệu tĩnh hoàn toàn, nên dựng Markdown một lần
+# lúc import thay vì cache theo lời gọi: mỗi rerun chỉ còn tra dict.
+_PRERENDERED = {
+    name: (
+        f"### {cls.name} Instructions",
+        cls.description,
+        "\n\n".join(f"• {step}" for step in cls.setup),
+        "\n".join(f"{i}. {step}" for i, step in enumerate(cls.execution, 1)),
+    )
+    for name, cls in INSTRUCTION_CLASSES.items()
+}
+
+
 def show_instructions(exercise_name):
-    inst = get_instruction_class(exercise_name)
-    
-    if not inst:
+    rendered = _PRERENDERED.get(exercise_name)
+
+    if not rendered:
         st.warning("Instructions not available for this exercise.")
         return
-    
-    st.markdown(f"### {inst.name} Instructions")
-    st.info(inst.description)
-    
+
+    title, description, setup_md, exec_md = rendered
+    st.markdown(title)
+    st.info(description)
+
     with st.expander("Hướng dẫn setup camera", expanded=True):
-        for step in inst.setup:
-            st.markdown(f"• {step}")
-    
+        st.markdown(setup_md)
+
     with st.expander("Cách thực hiện", expanded=True):
-        for i, step in enumerate(inst.execution, 1):
-            st.markdown(f"{i}. {step}")
\ No newline at end of file
+        st.markdown(exec_md)
\ No newline at end of file
@@ -1,114 +1,278 @@
 import time
+import array
+import atexit
 import psutil
+import queue
 import threading
+import weakref
 from collections import deque
 from datetime import datetime
 import json
 
 # BIẾN ĐIỀU KHIỂN CHÍNH: Chuyển thành True khi muốn bật lại
-ENABLE_PERFORMANCE_MONITOR = False 
+ENABLE_PERFORMANCE_MONITOR = False
 
-class PerformanceMonitor:
-    def __init__(self, window_size=30, log_to_file=False, terminal_interval=2.0):
-        self.enabled = ENABLE_PERFORMANCE_MONITOR
-        
-        # Nếu bị tắt, dừng khởi tạo các cấu trúc dữ liệu nặng
-        if not self.enabled:
-            return
+class _NullMonitor:
+    """Null-object khi monitor bị tắt: các no-op này được gọi thẳng,
+    không còn nhánh `if not self.enabled` nào trên đường đi của mỗi frame."""
+
+    def start_frame(self):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def reset(self):
+        pass
+
+    def get_metrics(self):
+        return {}
+
+class _ThreadState:
+    """Ring buffer + tổng chạy riêng của từng thread xử lý frame.
+
+    Chỉ thread sở hữu mới ghi vào đây nên end_frame không cần lock;
+    get_metrics (hiếm hơn nhiều) gom kết quả qua registry của monitor."""
+
+    def __init__(self, window_size):
+        self.window_size = window_size
 
         # FPS tracking
-        self.frame_times = deque(maxlen=window_size)
+        self.frame_times = array.array('d', [0.0] * window_size)
+        self.ft_idx = 0
+        self.ft_n = 0
+        self.sum_frame_times = 0.0
         self.last_frame_time = None
-        
+
         # Latency tracking
-        self.latencies = deque(maxlen=window_size)
-        self.frame_start_time = None
-        
-        # Memory tracking
+        self.latencies = array.array('d', [0.0] * window_size)
+        self.lat_idx = 0
+        self.lat_n = 0
+        self.sum_latency = 0.0
+        self.frame_start_ns = None
+
+        # Monotonic deque (index, value) cho min/max trượt: đầu deque luôn là
+        # min/max của cửa sổ hiện tại, push/pop amortized O(1) thay vì quét
+        # O(W) mỗi lần đọc.
+        self.sample_idx = 0
+        self.min_dq = deque()
+        self.max_dq = deque()
+
+        # Snapshot bất biến của các counter, gán bằng một phép store con trỏ
+        # (atomic dưới GIL) ở cuối end_frame; reader đọc tuple này không cần
+        # lock mà không bao giờ thấy trạng thái dở dang.
+        self.snapshot = (0, 0.0, 0, 0.0, 0.0, 0.0)
+
+    def publish(self):
+        self.snapshot = (
+            self.ft_n, self.sum_frame_times,
+            self.lat_n, self.sum_latency,
+            self.min_dq[0][1] if self.min_dq else 0.0,
+            self.max_dq[0][1] if self.max_dq else 0.0,
+        )
+
+    def clear(self):
+        for buf in (self.frame_times, self.latencies):
+            for i in range(self.window_size):
+                buf[i] = 0.0
+        self.ft_idx = self.ft_n = 0
+        self.lat_idx = self.lat_n = 0
+        self.sum_frame_times = self.sum_latency = 0.0
+        self.last_frame_time = None
+        self.frame_start_ns = None
+        self.sample_idx = 0
+        self.min_dq.clear()
+        self.max_dq.clear()
+        self.snapshot = (0, 0.0, 0, 0.0, 0.0, 0.0)
+
+class PerformanceMonitor:
+    def __init__(self, window_size=30, log_to_file=False, terminal_interval=2.0):
+        self.window_size = window_size
+
+        # Mỗi thread ghi vào _ThreadState cục bộ của nó (không lock trên
+        # đường nóng); WeakSet giữ danh sách state để get_metrics gom lại,
+        # và tự rụng khi thread kết thúc.
+        self._tls = threading.local()
+        self._states = weakref.WeakSet()
+
+        # Memory tracking: chỉ sample theo nhịp terminal_interval, không phải
+        # mỗi frame — memory_info() là một syscall, không cần ở 15-20 FPS.
         self.process = psutil.Process()
-        self.memory_samples = deque(maxlen=window_size)
-        
+        self._last_mem_mb = self.process.memory_info().rss / 1024 / 1024
+
         # Output control
-        self.terminal_interval = terminal_interval
-        self.last_terminal_print = time.time()
-        
-        # Logging
+        self.terminal_interval_ns = int(terminal_interval * 1e9)
+        self.last_terminal_print_ns = time.monotonic_ns()
+        self._iso_ts = datetime.now().isoformat()
+
+        # Dict metrics dùng lại giữa các lần gọi thay vì cấp phát mới mỗi
+        # lần; caller nào cần bản copy ổn định thì tự dict(m).
+        self._metrics_buf = {'fps': 0.0, 'avg_latency_ms': 0.0, 'min_latency_ms': 0.0,
+                             'max_latency_ms': 0.0, 'memory_mb': 0.0, 'timestamp': self._iso_ts}
+
+        # Logging: ghi CSV qua queue + thread nền để thread đo không phải
+        # trả chi phí I/O; queue đầy thì bỏ dòng cũ nhất.
         self.log_to_file = log_to_file
         self.log_file = f"performance_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        self._log_fh = None
+        self._log_queue = None
         self._init_log_file()
-        
+
         self.lock = threading.Lock()
-        
+
     def _init_log_file(self):
-        if self.enabled and self.log_to_file:
+        if self.log_to_file:
             try:
-                with open(self.log_file, 'w') as f:
-                    f.write("timestamp,fps,avg_latency_ms,min_latency_ms,max_latency_ms,memory_mb\n")
+                # buffering=1: line-buffered, mỗi dòng tự flush — một syscall
+                # write thay vì cặp open/close mỗi lần emit
+                self._log_fh = open(self.log_file, 'w', buffering=1)
+                self._log_fh.write("timestamp,fps,avg_latency_ms,min_latency_ms,max_latency_ms,memory_mb\n")
+                atexit.register(self._log_fh.close)
+                self._log_queue = queue.Queue(maxsize=1024)
+                writer = threading.Thread(target=self._drain_log_queue, daemon=True)
+                writer.start()
             except Exception as e:
                 print(f"Error creating log file: {e}")
-        
+                self.log_to_file = False
+
+    def _drain_log_queue(self):
+        while True:
+            self._log_fh.write(self._log_queue.get())
+
+    def _state(self):
+        s = getattr(self._tls, 'state', None)
+        if s is None:
+            s = _ThreadState(self.window_size)
+            self._tls.state = s
+            with self.lock:
+                self._states.add(s)
+        return s
+
     def start_frame(self):
-        if not self.enabled: return
-        self.frame_start_time = time.time()
-        
+        self._state().frame_start_ns = time.monotonic_ns()
+
     def end_frame(self):
-        if not self.enabled or self.frame_start_time is None:
+        s = self._state()
+        if s.frame_start_ns is None:
             return
-            
-        current_time = time.time()
-        with self.lock:
-            latency = (current_time - self.frame_start_time) * 1000
-            self.latencies.append(latency)
-            if self.last_frame_time is not None:
-                self.frame_times.append(current_time - self.last_frame_time)
-            self.last_frame_time = current_time
-            self.memory_samples.append(self.process.memory_info().rss / 1024 / 1024)
-            
-        if (current_time - self.last_terminal_print) >= self.terminal_interval:
-            self._print_to_terminal()
-            self.last_terminal_print = current_time
+
+        # Một lần monotonic_ns cho cả latency lẫn frame time: rẻ hơn hẳn
+        # time.time()/datetime.now() (không cấp phát object, không format).
+        now_ns = time.monotonic_ns()
+        latency = (now_ns - s.frame_start_ns) * 1e-6
+        s.sum_latency += latency - s.latencies[s.lat_idx]
+        s.latencies[s.lat_idx] = latency
+        s.lat_idx = (s.lat_idx + 1) % s.window_size
+        if s.lat_n < s.window_size:
+            s.lat_n += 1
+        min_dq, max_dq = s.min_dq, s.max_dq
+        while min_dq and min_dq[-1][1] >= latency:
+            min_dq.pop()
+        min_dq.append((s.sample_idx, latency))
+        while max_dq and max_dq[-1][1] <= latency:
+            max_dq.pop()
+        max_dq.append((s.sample_idx, latency))
+        expired = s.sample_idx - s.window_size
+        if min_dq[0][0] <= expired:
+            min_dq.popleft()
+        if max_dq[0][0] <= expired:
+            max_dq.popleft()
+        s.sample_idx += 1
+        if s.last_frame_time is not None:
+            dt = (now_ns - s.last_frame_time) * 1e-9
+            s.sum_frame_times += dt - s.frame_times[s.ft_idx]
+            s.frame_times[s.ft_idx] = dt
+            s.ft_idx = (s.ft_idx + 1) % s.window_size
+            if s.ft_n < s.window_size:
+                s.ft_n += 1
+        s.last_frame_time = now_ns
+        s.publish()
+
+        if (now_ns - self.last_terminal_print_ns) >= self.terminal_interval_ns:
+            # Chỉ lúc emit mới cần wall-clock cho log và sample memory
+            self._iso_ts = datetime.now().isoformat()
+            self._last_mem_mb = self.process.memory_info().rss / 1024 / 1024
+            # Tính metrics một lần rồi dùng chung cho cả print và log
+            m = self.get_metrics()
+            self._print_to_terminal(m)
+            self.last_terminal_print_ns = now_ns
             if self.log_to_file:
-                self._log_to_csv()
-            
+                self._log_to_csv(m)
+
     def get_metrics(self):
-        if not self.enabled: return {}
+        # Lock chỉ để copy danh sách state (đăng ký thread mới là hiếm);
+        # counter được đọc qua snapshot tuple nên không chặn end_frame.
         with self.lock:
-            metrics = {'fps': 0.0, 'avg_latency_ms': 0.0, 'memory_mb': 0.0, 'timestamp': datetime.now().isoformat()}
-            if len(self.frame_times) > 0:
-                metrics['fps'] = 1.0 / (sum(self.frame_times) / len(self.frame_times))
-            if len(self.memory_samples) > 0:
-                metrics['memory_mb'] = sum(self.memory_samples) / len(self.memory_samples)
-            return metrics
-    
-    def _print_to_terminal(self):
-        if not self.enabled: return
-        m = self.get_metrics()
+            states = list(self._states)
+        ft_n = lat_n = 0
+        sum_ft = sum_lat = 0.0
+        min_lat = max_lat = None
+        for s in states:
+            s_ft_n, s_sum_ft, s_lat_n, s_sum_lat, s_min, s_max = s.snapshot
+            ft_n += s_ft_n
+            lat_n += s_lat_n
+            sum_ft += s_sum_ft
+            sum_lat += s_sum_lat
+            if s_lat_n > 0:
+                if min_lat is None or s_min < min_lat:
+                    min_lat = s_min
+                if max_lat is None or s_max > max_lat:
+                    max_lat = s_max
+        metrics = self._metrics_buf
+        metrics['fps'] = 1.0 / (sum_ft / ft_n) if ft_n > 0 else 0.0
+        metrics['avg_latency_ms'] = sum_lat / lat_n if lat_n > 0 else 0.0
+        metrics['min_latency_ms'] = min_lat if min_lat is not None else 0.0
+        metrics['max_latency_ms'] = max_lat if max_lat is not None else 0.0
+        metrics['memory_mb'] = self._last_mem_mb
+        metrics['timestamp'] = self._iso_ts
+        return metrics
+
+    def _print_to_terminal(self, m=None):
+        if m is None:
+            m = self.get_metrics()
         print(f"\n[Performance] {m['fps']:.1f} FPS | {m['memory_mb']:.1f} MB")
-    
-    def _log_to_csv(self):
-        if not self.enabled: return
+
+    def _log_to_csv(self, m=None):
+        if m is None:
+            m = self.get_metrics()
+        line = (f"{m['timestamp']},{m['fps']:.2f},{m['avg_latency_ms']:.2f},"
+                f"{m['min_latency_ms']:.2f},{m['max_latency_ms']:.2f},{m['memory_mb']:.2f}\n")
+        try:
+            self._log_queue.put_nowait(line)
+        except queue.Full:
+            # Bỏ dòng cũ nhất để dòng mới nhất luôn được ghi
+            try:
+                self._log_queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._log_queue.put_nowait(line)
+            except queue.Full:
+                pass
+
+    def reset(self):
+        with self.lock:
+            for s in self._states:
+                s.clear()
 
 class TrackerWithMonitoring:
     def __init__(self, tracker, terminal_interval=2.0):
         self.tracker = tracker
-        self.enabled = ENABLE_PERFORMANCE_MONITOR
-        # Chỉ tạo đối tượng monitor nếu thực sự cần thiết
-        if self.enabled:
+        # Chọn monitor thật hay null-object một lần duy nhất ở đây
+        if ENABLE_PERFORMANCE_MONITOR:
             self.perf_monitor = PerformanceMonitor(terminal_interval=terminal_interval)
-    
+        else:
+            self.perf_monitor = _NullMonitor()
+
     def process_frame(self, frame):
-        if not self.enabled:
-            return self.tracker.process_frame(frame)
-            
         self.perf_monitor.start_frame()
         result = self.tracker.process_frame(frame)
         self.perf_monitor.end_frame()
         return result
-    
+
     def reset(self):
         self.tracker.reset()
-        if self.enabled:
-            self.perf_monitor.reset()
+        self.perf_monitor.reset()
 
     def __getattr__(self, name):
-        return getattr(self.tracker, name)
\ No newline at end of file
+        return getattr(self.tracker, name)